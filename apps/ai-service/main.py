@@ -7,10 +7,17 @@ Phase 2: Deep Learning verifies if fixed
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import asyncio
 import io
 import base64
+import hashlib
 import os
+import re
 import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import cv2
 import numpy as np
@@ -20,7 +27,15 @@ import torchvision.transforms as transforms
 import torchvision.models as models
 from groq import Groq
 
-app = FastAPI(title="AI Defect Detection")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load models in the background so health checks pass while weights load"""
+    threading.Thread(target=load_models, name="model-loader", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="AI Defect Detection", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,53 +45,153 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize models
-print("Loading models...")
+# Initialize clients (models are loaded in the background, see load_models)
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
+# Phase 1 requests run concurrently; cap them to stay within Groq rate limits
+GROQ_MAX_CONCURRENCY = 4
+groq_executor = ThreadPoolExecutor(max_workers=GROQ_MAX_CONCURRENCY, thread_name_prefix="groq")
+
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-# ResNet for image-to-image comparison (Phase 2 - Image Mode)
-resnet = models.resnet50(pretrained=True)
-resnet.eval()
-resnet = resnet.to(device)
+# Inputs are always 224x224, so let cuDNN benchmark and cache the fastest conv kernels
+if device.type == 'cuda':
+    torch.backends.cudnn.benchmark = True
 
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
+# NHWC layout lets cuDNN use Tensor Core friendly conv kernels on GPU
+memory_format = torch.channels_last if device.type == 'cuda' else torch.contiguous_format
+
+
+def inference_autocast():
+    """FP16 autocast for ResNet forwards on CUDA; no-op on CPU"""
+    return torch.autocast(device_type=device.type, dtype=torch.float16, enabled=device.type == 'cuda')
+
+
+# Tensor conversion + ImageNet normalization, for images already at 224x224
+to_normalized_tensor = transforms.Compose([
     transforms.ToTensor(),
     transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
 ])
 
-print(f"✓ ResNet loaded on {device}")
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    to_normalized_tensor
+])
+
+# Set by load_models; requests that need the models wait on models_ready
+resnet = None
+resnet_backbone = None
+clip_model = None
+clip_preprocess = None
+CLIP_AVAILABLE = False
+models_ready = threading.Event()
+model_load_error: Optional[str] = None
+
+
+def load_models():
+    """
+    Load (and compile/warm up) ResNet and CLIP. Runs in a background thread
+    started at server startup, so the server accepts connections immediately.
+    """
+    global resnet, resnet_backbone, clip_model, clip_preprocess, CLIP_AVAILABLE, model_load_error
+    
+    print("Loading models...")
+    try:
+        # ResNet for image-to-image comparison (Phase 2 - Image Mode)
+        resnet_model = models.resnet50(pretrained=True)
+        resnet_model.eval()
+        resnet_model = resnet_model.to(device, memory_format=memory_format)
+        
+        # Backbone (everything before the final FC layer) for frame-matching embeddings
+        backbone = torch.nn.Sequential(*list(resnet_model.children())[:-1])
+        
+        # Compile both graphs (224x224 input, batch size varies per call); set DISABLE_TORCH_COMPILE=1 to debug in eager mode
+        if hasattr(torch, "compile") and not os.getenv("DISABLE_TORCH_COMPILE"):
+            try:
+                compiled_resnet = torch.compile(resnet_model)
+                compiled_backbone = torch.compile(backbone)
+                # Warm up so first-call compilation happens at startup, not inside a request.
+                # Two batch sizes make dynamo compile the dynamic-batch graph up front.
+                with torch.no_grad(), inference_autocast():
+                    for batch_size in (1, 2):
+                        dummy = torch.zeros(batch_size, 3, 224, 224, device=device).to(memory_format=memory_format)
+                        compiled_resnet(dummy)
+                        compiled_backbone(dummy)
+                resnet_model, backbone = compiled_resnet, compiled_backbone
+                print("✓ ResNet compiled with torch.compile")
+            except Exception as e:
+                print(f"⚠ torch.compile unavailable, using eager ResNet: {e}")
+        
+        resnet, resnet_backbone = resnet_model, backbone
+        print(f"✓ ResNet loaded on {device}")
+        
+        # CLIP for video-to-image comparison (Phase 2 - Video Mode)
+        # CLIP is more robust to compression artifacts and quality differences
+        try:
+            import clip
+            clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
+            clip_model.eval()
+            CLIP_AVAILABLE = True
+            print(f"✓ CLIP loaded on {device}")
+        except ImportError:
+            print("⚠ CLIP not installed. Run: pip install git+https://github.com/openai/CLIP.git")
+            CLIP_AVAILABLE = False
+        except Exception as e:
+            print(f"⚠ CLIP failed to load: {e}")
+            CLIP_AVAILABLE = False
+        
+        print(f"✓ All models loaded")
+    except Exception as e:
+        model_load_error = str(e)
+        print(f"✗ Model loading failed: {e}")
+    finally:
+        models_ready.set()
+
 
-# CLIP for video-to-image comparison (Phase 2 - Video Mode)
-# CLIP is more robust to compression artifacts and quality differences
-try:
-    import clip
-    clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
-    clip_model.eval()
-    CLIP_AVAILABLE = True
-    print(f"✓ CLIP loaded on {device}")
-except ImportError:
-    print("⚠ CLIP not installed. Run: pip install git+https://github.com/openai/CLIP.git")
-    CLIP_AVAILABLE = False
-except Exception as e:
-    print(f"⚠ CLIP failed to load: {e}")
-    CLIP_AVAILABLE = False
+# One reusable JPEG buffer per thread (encodes run on the event loop and Groq workers)
+encode_buffers = threading.local()
+
+
+def image_to_base64(img: Image.Image, quality: int = 90) -> str:
+    """Convert PIL image to a base64 JPEG data URL"""
+    buffered = getattr(encode_buffers, "buffer", None)
+    if buffered is None:
+        buffered = encode_buffers.buffer = io.BytesIO()
+    
+    # Overwrite from the start and truncate afterwards, so the allocation is kept
+    buffered.seek(0)
+    img.save(buffered, format="JPEG", quality=quality)
+    buffered.truncate()
+    
+    # getbuffer() exposes the bytes without the copy getvalue() makes
+    with buffered.getbuffer() as jpeg_bytes:
+        return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode()
 
-print(f"✓ All models loaded")
 
+# Longest side of images sent to Groq Vision. Defect locations come back as
+# percentages, so they map onto the full-resolution image unchanged.
+GROQ_MAX_IMAGE_SIDE = 1024
+# JPEG quality for Groq payloads - the model doesn't need display-grade images
+GROQ_JPEG_QUALITY = 85
 
-def image_to_base64(img: Image.Image) -> str:
-    """Convert PIL image to base64"""
-    buffered = io.BytesIO()
-    img.save(buffered, format="JPEG", quality=90)
-    return "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode()
+
+def downscale_for_groq(img: Image.Image) -> Image.Image:
+    """Return a copy of the image no larger than GROQ_MAX_IMAGE_SIDE on its longest side"""
+    if max(img.size) <= GROQ_MAX_IMAGE_SIDE:
+        return img
+    small = img.copy()
+    small.thumbnail((GROQ_MAX_IMAGE_SIDE, GROQ_MAX_IMAGE_SIDE))
+    return small
+
+
+# Minimum shorter side for decoded JPEG uploads. libjpeg can decode at 1/2, 1/4
+# or 1/8 scale directly, which is far cheaper than a full decode plus resize.
+DECODE_MIN_SIDE = 1024
 
 
 # Video file extensions
-VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v'}
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v'})
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'})
 
 
 def is_video_file(filename: str) -> bool:
@@ -166,19 +281,30 @@ def extract_frames_from_video(video_content: bytes, fps: float = 1.0, max_frames
     return frames
 
 
-async def process_upload(upload: UploadFile) -> Tuple[List[Image.Image], str]:
+async def process_upload(upload: UploadFile, content: bytes) -> Tuple[List[Image.Image], str]:
     """
-    Process an upload file - handles both images and videos.
+    Process an upload file (already read into content) - handles both images and videos.
     
     Returns:
         Tuple of (list of PIL images, media type: 'image' or 'video')
     """
-    content = await upload.read()
     filename = upload.filename or ""
     content_type = upload.content_type or ""
     
     print(f"[Upload] Received: filename={filename}, content_type={content_type}, size={len(content)} bytes")
     
+    # Decoding is CPU-bound and OpenCV/Pillow release the GIL, so run it in a
+    # worker thread - this lets all uploads of a request decode concurrently
+    return await asyncio.to_thread(decode_upload, content, filename, content_type)
+
+
+def decode_upload(content: bytes, filename: str, content_type: str) -> Tuple[List[Image.Image], str]:
+    """
+    Decode raw upload bytes into frames - handles both images and videos.
+    
+    Returns:
+        Tuple of (list of PIL images, media type: 'image' or 'video')
+    """
     # Detect video by filename OR content-type
     is_video = is_video_file(filename) or content_type.startswith('video/')
     
@@ -192,8 +318,10 @@ async def process_upload(upload: UploadFile) -> Tuple[List[Image.Image], str]:
         # Treat as image
         print(f"[Upload] Processing as IMAGE: {filename}")
         try:
-            pil_img = Image.open(io.BytesIO(content)).convert("RGB")
-            return [pil_img], "image"
+            pil_img = Image.open(io.BytesIO(content))
+            # JPEGs decode at a reduced DCT scale while the shorter side stays >= DECODE_MIN_SIDE
+            pil_img.draft("RGB", (DECODE_MIN_SIDE, DECODE_MIN_SIDE))
+            return [pil_img.convert("RGB")], "image"
         except Exception as e:
             # Maybe it's a video that wasn't detected correctly
             print(f"[Upload] Failed to open as image, trying as video: {e}")
@@ -203,41 +331,40 @@ async def process_upload(upload: UploadFile) -> Tuple[List[Image.Image], str]:
             raise HTTPException(status_code=400, detail=f"Could not process file: {filename}. Error: {str(e)}")
 
 
-def compute_image_similarity(img1: Image.Image, img2: Image.Image) -> float:
+def extract_image_features(images: List[Image.Image]) -> torch.Tensor:
     """
-    Compute similarity between two images using ResNet features.
-    Returns a value between 0 and 1 (1 = identical, 0 = completely different).
+    Extract L2-normalized ResNet backbone features for a batch of images.
+    Returns an (N, 2048) tensor; cosine similarity between rows is a single dot product.
     """
-    # Resize both images to same size
-    img1_resized = img1.resize((224, 224))
-    img2_resized = img2.resize((224, 224))
-    
-    # Convert to tensors
-    tensor1 = transform(img1_resized).unsqueeze(0).to(device)
-    tensor2 = transform(img2_resized).unsqueeze(0).to(device)
-    
-    # Extract features
-    with torch.no_grad():
-        # Get features before final FC layer
-        features1 = torch.nn.Sequential(*list(resnet.children())[:-1])(tensor1).flatten()
-        features2 = torch.nn.Sequential(*list(resnet.children())[:-1])(tensor2).flatten()
-    
-    # Compute cosine similarity
-    similarity = torch.nn.functional.cosine_similarity(features1.unsqueeze(0), features2.unsqueeze(0)).item()
+    # Resize to network input size once and stack into one batch for a single forward pass
+    batch = torch.stack([to_normalized_tensor(img.resize((224, 224))) for img in images])
+    batch = batch.to(device, memory_format=memory_format)
     
-    # Normalize to 0-1 range (cosine similarity is -1 to 1)
-    similarity = (similarity + 1) / 2
+    with torch.no_grad(), inference_autocast():
+        # Get features before final FC layer (back in FP32 for normalization)
+        features = resnet_backbone(batch).float().flatten(1)
+        features = torch.nn.functional.normalize(features, dim=1)
     
-    return similarity
+    return features
+
+
+# Mean absolute difference (0-255) on 64x64 grayscale thumbnails below which a
+# frame is treated as the same view as the reference whatever its feature similarity
+NEAR_IDENTICAL_MAD = 4.0
+
+
+def grayscale_thumbnail(img: Image.Image) -> np.ndarray:
+    """Small grayscale thumbnail for cheap pixel-level comparisons"""
+    return np.asarray(img.resize((64, 64), reducing_gap=3.0).convert("L"), dtype=np.float32)
 
 
-def filter_matching_frames(reference_img: Image.Image, frames: List[Image.Image], threshold: float = 0.5) -> List[Image.Image]:
+def filter_matching_frames(references: List[Image.Image], frames: List[Image.Image], threshold: float = 0.5) -> List[Image.Image]:
     """
-    Filter video frames to only include those that are similar to the reference image.
+    Filter video frames to only include those that are similar to at least one reference image.
     This handles panning videos where only some frames show the relevant area.
     
     Args:
-        reference_img: The reference image (before image)
+        references: The reference images (before images)
         frames: List of video frames
         threshold: Minimum similarity (0-1) to include a frame
         
@@ -246,8 +373,31 @@ def filter_matching_frames(reference_img: Image.Image, frames: List[Image.Image]
     """
     matching_frames = []
     
+    # Mean absolute difference of every frame against every reference thumbnail, shape (frames, references)
+    reference_thumbs = np.stack([grayscale_thumbnail(img) for img in references])
+    frame_thumbs = np.stack([grayscale_thumbnail(frame) for frame in frames])
+    mads = np.abs(frame_thumbs[:, None] - reference_thumbs[None]).mean(axis=(2, 3)).min(axis=1).tolist()
+    
+    # Frames near pixel-identical to some reference match trivially; only the rest need ResNet
+    near_identical = {i: mad for i, mad in enumerate(mads) if mad < NEAR_IDENTICAL_MAD}
+    candidates = [i for i in range(len(frames)) if i not in near_identical]
+    similarities = {}
+    if candidates:
+        # One batched forward pass for the references and the remaining frames
+        features = extract_image_features(references + [frames[i] for i in candidates])
+        reference_features, frame_features = features[:len(references)], features[len(references):]
+        # Best cosine similarity against any reference, mapped to the 0-1 range
+        scores = ((frame_features @ reference_features.T).max(dim=1).values + 1) / 2
+        similarities = dict(zip(candidates, scores.tolist()))
+    
     for i, frame in enumerate(frames):
-        similarity = compute_image_similarity(reference_img, frame)
+        if i in near_identical:
+            matching_frames.append(frame)
+            print(f"[FrameMatch] Frame {i}: near-identical to a reference (MAD={near_identical[i]:.2f})")
+            print("  → MATCHED")
+            continue
+        
+        similarity = similarities[i]
         print(f"[FrameMatch] Frame {i}: similarity = {similarity:.3f} (threshold={threshold})")
         
         if similarity >= threshold:
@@ -256,19 +406,63 @@ def filter_matching_frames(reference_img: Image.Image, frames: List[Image.Image]
         else:
             print(f"  → REJECTED (too different)")
     
-    print(f"[FrameMatch] {len(matching_frames)}/{len(frames)} frames matched reference")
+    print(f"[FrameMatch] {len(matching_frames)}/{len(frames)} frames matched a reference")
     return matching_frames
 
 
+# Groq response parsing. A field line contains "DEFECT:" (checked first) or
+# "LOCATION:" anywhere, and its value is everything after the line's first colon.
+NO_DEFECT_PATTERN = re.compile(r"NO_DEFECT", re.IGNORECASE)
+RESPONSE_FIELD_PATTERN = re.compile(
+    r"^(?=.*?(?P<defect>DEFECT:)|.*?LOCATION:)[^:\n]*:(?P<value>.*)$",
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+# Recent Groq detections keyed by a hash of the exact image payloads sent, so a
+# before/after pair that was already analyzed skips the network round-trip.
+# Phase 1 runs on several threads at once, hence the lock.
+DETECTION_CACHE_SIZE = 64
+detection_cache: "OrderedDict[str, Dict]" = OrderedDict()
+detection_cache_lock = threading.Lock()
+
+
 def phase1_detect_defect(before_img: Image.Image, after_img: Image.Image) -> Dict:
     """
     Phase 1: Use Groq Vision to detect defect by comparing before and after
     Returns: defect description and bounding box coordinates
     """
-    # Convert both images to base64
-    before_b64 = image_to_base64(before_img).split(',')[1]
-    after_b64 = image_to_base64(after_img).split(',')[1]
+    # Convert both images to base64 data URLs (downscaled - bbox is returned in percentages)
+    before_url = image_to_base64(downscale_for_groq(before_img), quality=GROQ_JPEG_QUALITY)
+    after_url = image_to_base64(downscale_for_groq(after_img), quality=GROQ_JPEG_QUALITY)
     
+    # Feed the hasher piecewise rather than concatenating two large data URLs first
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(before_url.encode())
+    hasher.update(b"|")
+    hasher.update(after_url.encode())
+    key = hasher.hexdigest()
+    with detection_cache_lock:
+        cached = detection_cache.get(key)
+        if cached is not None:
+            detection_cache.move_to_end(key)
+    if cached is not None:
+        print(f"Groq cache hit: {key}")
+        return dict(cached)
+    
+    detection = groq_detect_defect(before_url, after_url)
+    
+    # Failed calls are not cached so they are retried next time
+    if "error" not in detection:
+        with detection_cache_lock:
+            detection_cache[key] = detection
+            while len(detection_cache) > DETECTION_CACHE_SIZE:
+                detection_cache.popitem(last=False)
+    return dict(detection)
+
+
+def groq_detect_defect(before_url: str, after_url: str) -> Dict:
+    """Ask Groq Vision for the main defect, given before/after image data URLs"""
     # Compare both images to find defects
     prompt = """You are an expert inspector. Compare these TWO images:
 - Image 1: BEFORE (showing the defect/damage)
@@ -311,9 +505,9 @@ Now compare the images:"""
                 "content": [
                     {"type": "text", "text": prompt},
                     {"type": "text", "text": "BEFORE image:"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{before_b64}"}},
+                    {"type": "image_url", "image_url": {"url": before_url}},
                     {"type": "text", "text": "AFTER image:"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{after_b64}"}}
+                    {"type": "image_url", "image_url": {"url": after_url}}
                 ]
             }],
             temperature=0.2,
@@ -324,22 +518,20 @@ Now compare the images:"""
         print(f"Groq response: {result_text[:300]}")
         
         # Parse response
-        if "NO_DEFECT" in result_text.upper():
+        if NO_DEFECT_PATTERN.search(result_text):
             return {"has_defect": False, "description": "No defect found"}
         
-        # Extract defect info
+        # Extract defect info (one regex pass over all lines; later lines win)
         description = None
         bbox = None
         
-        lines = result_text.strip().split('\n')
-        for line in lines:
-            line = line.strip()
+        for match in RESPONSE_FIELD_PATTERN.finditer(result_text):
+            value = match.group("value").strip()
             
-            if 'DEFECT:' in line.upper():
-                description = line.split(':', 1)[1].strip()
-            elif 'LOCATION:' in line.upper():
-                coords_str = line.split(':', 1)[1].strip()
-                coords_str = coords_str.replace('```', '').strip()
+            if match.group("defect"):
+                description = value
+            else:
+                coords_str = value.replace('```', '').strip()
                 try:
                     # Handle both "x,y,w,h" and "x y w h" formats
                     parts = [float(x.strip()) for x in coords_str.replace(',', ' ').split()]
@@ -366,22 +558,34 @@ Now compare the images:"""
         return {"has_defect": False, "error": str(e)}
 
 
+def regions_identical(before_region: np.ndarray, after_region: np.ndarray) -> bool:
+    """Check if two regions are pixel-identical (e.g. the same photo uploaded twice)"""
+    return before_region.shape == after_region.shape and np.array_equal(before_region, after_region)
+
+
 def phase2_verify_repair(before_region: np.ndarray, after_region: np.ndarray) -> Dict:
     """
     Phase 2: Deep Learning verifies if defect was fixed
-    Compares before and after regions using ResNet features
+    Compares before and after RGB regions using ResNet features
     """
-    # Convert to PIL
-    before_pil = Image.fromarray(cv2.cvtColor(before_region, cv2.COLOR_BGR2RGB))
-    after_pil = Image.fromarray(cv2.cvtColor(after_region, cv2.COLOR_BGR2RGB))
+    # Identical regions have zero feature distance - skip the forward pass
+    if regions_identical(before_region, after_region):
+        return {
+            "is_fixed": False,
+            "confidence": 0.0,
+            "feature_distance": 0.0,
+            "verdict": "NOT_FIXED",
+            "method": "resnet"
+        }
     
-    # Extract deep features
-    with torch.no_grad():
-        before_tensor = transform(before_pil).unsqueeze(0).to(device)
-        after_tensor = transform(after_pil).unsqueeze(0).to(device)
-        
-        before_features = resnet(before_tensor).cpu().numpy().flatten()
-        after_features = resnet(after_tensor).cpu().numpy().flatten()
+    # Regions are RGB arrays - wrap as PIL without a color conversion
+    before_pil = Image.fromarray(before_region)
+    after_pil = Image.fromarray(after_region)
+    
+    # Extract deep features for both regions in a single batched forward pass
+    with torch.no_grad(), inference_autocast():
+        batch = torch.stack([transform(before_pil), transform(after_pil)]).to(device, memory_format=memory_format)
+        before_features, after_features = resnet(batch).float().cpu().numpy()
     
     # Calculate similarity
     distance = float(np.linalg.norm(before_features - after_features))
@@ -414,25 +618,32 @@ def phase2_verify_repair_video(before_region: np.ndarray, after_region: np.ndarr
         print("[Video Mode] CLIP not available, falling back to ResNet")
         return phase2_verify_repair(before_region, after_region)
     
-    # Convert to PIL
-    before_pil = Image.fromarray(cv2.cvtColor(before_region, cv2.COLOR_BGR2RGB))
-    after_pil = Image.fromarray(cv2.cvtColor(after_region, cv2.COLOR_BGR2RGB))
+    # Identical regions have cosine similarity 1.0 - skip the forward pass
+    if regions_identical(before_region, after_region):
+        return {
+            "is_fixed": False,
+            "confidence": 1.0,
+            "similarity": 1.0,
+            "verdict": "NOT_FIXED",
+            "method": "clip"
+        }
     
-    # Preprocess for CLIP
-    before_tensor = clip_preprocess(before_pil).unsqueeze(0).to(device)
-    after_tensor = clip_preprocess(after_pil).unsqueeze(0).to(device)
+    # Regions are RGB arrays - wrap as PIL without a color conversion
+    before_pil = Image.fromarray(before_region)
+    after_pil = Image.fromarray(after_region)
     
-    # Extract CLIP features
+    # Preprocess for CLIP and stack both regions into one batch
+    batch = torch.stack([clip_preprocess(before_pil), clip_preprocess(after_pil)]).to(device)
+    
+    # Extract CLIP features in a single forward pass
     with torch.no_grad():
-        before_features = clip_model.encode_image(before_tensor)
-        after_features = clip_model.encode_image(after_tensor)
+        features = clip_model.encode_image(batch)
         
         # Normalize features
-        before_features = before_features / before_features.norm(dim=-1, keepdim=True)
-        after_features = after_features / after_features.norm(dim=-1, keepdim=True)
+        features = features / features.norm(dim=-1, keepdim=True)
         
         # Cosine similarity (1.0 = identical, 0.0 = completely different)
-        similarity = (before_features @ after_features.T).item()
+        similarity = (features[0] @ features[1]).item()
     
     print(f"[CLIP] Cosine similarity: {similarity:.4f}")
     
@@ -501,11 +712,163 @@ def draw_annotations(before_img: np.ndarray, after_img: np.ndarray,
     return before_img, after_img
 
 
+def frame_base64(frame: Dict) -> str:
+    """Base64-encode a frame once and reuse it across the response"""
+    if "base64" not in frame:
+        frame["base64"] = image_to_base64(frame["pil"])
+    return frame["base64"]
+
+
+def verify_defect(defect: Dict, after_data: List[Dict], use_clip: bool) -> Dict:
+    """
+    Phase 2 for a single detected defect: compare its region against every
+    after frame and keep the best match.
+    """
+    print(f"[Analyze] Processing {defect['defect_id']}: {defect['description']}")
+    
+    before = defect["before_data"]
+    bbox_percent = defect["bbox_percent"]
+    
+    # Try each after image and find the best match
+    best_result = None
+    best_confidence = -1
+    best_after_idx = None
+    
+    # Convert bbox to pixels and extract the before region once
+    x1, y1, x2, y2 = convert_bbox_percent_to_pixels(
+        bbox_percent, before["width"], before["height"]
+    )
+    before_region = before["rgb"][y1:y2, x1:x2]
+    
+    for after in after_data:
+        try:
+            # The bbox is in percentages, so crop the same relative region at the after
+            # frame's own resolution - phase 2 resizes both regions to 224x224 anyway,
+            # so the full after frame never needs resizing to the before dimensions
+            ax1, ay1, ax2, ay2 = convert_bbox_percent_to_pixels(
+                bbox_percent, after["width"], after["height"]
+            )
+            after_region = after["rgb"][ay1:ay2, ax1:ax2]
+            
+            if before_region.size == 0 or after_region.size == 0:
+                continue
+            
+            # Verify repair - use CLIP for video mode, ResNet for image mode
+            if use_clip:
+                result = phase2_verify_repair_video(before_region, after_region)
+            else:
+                result = phase2_verify_repair(before_region, after_region)
+            
+            # Track best result (highest confidence for FIXED, or least bad for NOT_FIXED)
+            if result["is_fixed"]:
+                # For fixed results, prefer higher confidence
+                if result["confidence"] > best_confidence:
+                    best_confidence = result["confidence"]
+                    best_result = result
+                    best_after_idx = after["index"]
+            elif best_result is None or not best_result.get("is_fixed"):
+                # For not-fixed, track the one with highest score (closest to maybe fixed)
+                score = result.get("feature_distance", result.get("similarity", 0))
+                if score > best_confidence:
+                    best_confidence = score
+                    best_result = result
+                    best_after_idx = after["index"]
+                    
+        except Exception as e:
+            print(f"  Error comparing with after image {after['index']}: {e}")
+            continue
+    
+    # Build result for this defect
+    if not best_result:
+        return {
+            "defect_id": defect["defect_id"],
+            "status": "error",
+            "description": defect["description"],
+            "before_image_idx": defect["before_image_idx"],
+            "message": "Could not verify repair for this defect"
+        }
+    
+    print(f"  → {best_result['verdict']} (confidence: {best_result['confidence']:.2f}, method: {best_result.get('method', 'unknown')})")
+    return {
+        "defect_id": defect["defect_id"],
+        "status": "success",
+        "description": defect["description"],
+        "before_image_idx": defect["before_image_idx"],
+        "best_after_image_idx": best_after_idx,
+        "bbox": {
+            "x": bbox_percent[0],
+            "y": bbox_percent[1],
+            "width": bbox_percent[2],
+            "height": bbox_percent[3]
+        },
+        "phase2_deep_learning": {
+            "verdict": best_result["verdict"],
+            "is_fixed": best_result["is_fixed"],
+            "confidence": best_result["confidence"],
+            "feature_distance": best_result.get("feature_distance", 0),
+            "similarity": best_result.get("similarity", 0),
+            "method": best_result.get("method", "unknown")
+        },
+        "before_image": frame_base64(before),
+        "after_image": frame_base64(after_data[best_after_idx]) if best_after_idx is not None else None
+    }
+
+
+# Recent /analyze responses keyed by a hash of the uploaded content, so retries
+# and repeated submissions of the same media skip Groq and the models entirely
+RESULT_CACHE_SIZE = 16
+# Responses embed every frame as a base64 JPEG, so the cache is also capped by payload size
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+result_cache: "OrderedDict[str, Dict]" = OrderedDict()
+result_cache_bytes = 0
+
+
+def result_cache_key(before_images: List[UploadFile], after_images: List[UploadFile], contents: List[bytes]) -> str:
+    """Hash every upload (name, type, bytes) in order, keeping before/after separate"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{len(before_images)}:{len(after_images)}".encode())
+    for upload, content in zip([*before_images, *after_images], contents):
+        hasher.update(f"|{upload.filename or ''}|{upload.content_type or ''}|{len(content)}|".encode())
+        hasher.update(content)
+    return hasher.hexdigest()
+
+
+def result_payload_bytes(result: Dict) -> int:
+    """Approximate size of a response; the base64 images dominate it"""
+    # Defect images are the same memoized strings as the frame lists, so count each once
+    images = {id(image): len(image) for image in [*result["before_images"], *result["after_images"]]}
+    for defect in result["defects"]:
+        for key in ("before_image", "after_image"):
+            if defect.get(key):
+                images[id(defect[key])] = len(defect[key])
+    return sum(images.values())
+
+
+def cache_result(key: str, result: Dict) -> None:
+    """Store a response, evicting least recently used ones past the entry or byte limit"""
+    global result_cache_bytes
+    
+    size = result_payload_bytes(result)
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    
+    if key in result_cache:
+        result_cache_bytes -= result_payload_bytes(result_cache[key])
+    result_cache[key] = result
+    result_cache.move_to_end(key)
+    result_cache_bytes += size
+    
+    while len(result_cache) > RESULT_CACHE_SIZE or result_cache_bytes > RESULT_CACHE_MAX_BYTES:
+        _, evicted = result_cache.popitem(last=False)
+        result_cache_bytes -= result_payload_bytes(evicted)
+
+
 @app.get("/")
 def root():
     return {
         "service": "AI Defect Detection",
         "status": "running",
+        "models_loaded": models_ready.is_set() and model_load_error is None,
         "phases": [
             "1. Groq Vision detects defect",
             "2. Deep Learning verifies repair"
@@ -541,12 +904,34 @@ async def analyze(
     
     print(f"[Analyze] Received {len(before_images)} before uploads, {len(after_images)} after uploads")
     
+    # Return a cached response if exactly this media was analyzed recently
+    uploads = [*before_images, *after_images]
+    contents = [await upload.read() for upload in uploads]
+    cache_key = result_cache_key(before_images, after_images, contents)
+    if cache_key in result_cache:
+        print(f"[Analyze] Cache hit for {cache_key}")
+        result_cache.move_to_end(cache_key)
+        return result_cache[cache_key]
+    
+    # Models load in the background after startup; wait for them on first use
+    if not models_ready.is_set():
+        print("[Analyze] Waiting for models to finish loading...")
+        await asyncio.to_thread(models_ready.wait)
+    if model_load_error:
+        raise HTTPException(status_code=503, detail=f"Models failed to load: {model_load_error}")
+    
     # STEP 1: Process all uploads (handles both images and videos)
+    # All uploads are decoded concurrently; results keep upload order
+    processed = await asyncio.gather(*(process_upload(upload, content) for upload, content in zip(uploads, contents)))
+    # Only cache_key is needed from here on; release the raw upload bytes
+    del contents
+    before_processed = processed[:len(before_images)]
+    after_processed = processed[len(before_images):]
+    
     all_before_frames = []
     before_media_types = []
     
-    for i, upload in enumerate(before_images):
-        frames, media_type = await process_upload(upload)
+    for i, (frames, media_type) in enumerate(before_processed):
         before_media_types.append(media_type)
         print(f"[Analyze] Before upload {i}: {media_type}, {len(frames)} frame(s)")
         for frame in frames:
@@ -556,8 +941,7 @@ async def analyze(
     after_media_types = []
     after_had_video = False
     
-    for i, upload in enumerate(after_images):
-        frames, media_type = await process_upload(upload)
+    for i, (frames, media_type) in enumerate(after_processed):
         after_media_types.append(media_type)
         if media_type == "video":
             after_had_video = True
@@ -572,13 +956,11 @@ async def analyze(
     if after_had_video and len(all_before_frames) > 0:
         print("[Analyze] Filtering video frames to match before images...")
         
-        filtered_after_frames = []
-        for before_frame in all_before_frames:
-            # Find after frames similar to this before frame
-            matching = filter_matching_frames(before_frame, all_after_frames, threshold=0.4)
-            for frame in matching:
-                if frame not in filtered_after_frames:
-                    filtered_after_frames.append(frame)
+        # Every before frame is scored at once; a frame is kept if it matches any of them
+        # Runs in a worker thread so the event loop keeps serving other requests during the ResNet pass
+        filtered_after_frames = await asyncio.to_thread(
+            filter_matching_frames, all_before_frames, all_after_frames, threshold=0.4
+        )
         
         if filtered_after_frames:
             print(f"[Analyze] Using {len(filtered_after_frames)} filtered frames (from {len(all_after_frames)} total)")
@@ -588,153 +970,85 @@ async def analyze(
             # Fall back to using all frames if none match (threshold might be too strict)
     
     # Build frame data structures
+    # np.asarray keeps Pillow's exported buffer (np.array would copy it again);
+    # the arrays are read-only and only ever cropped
     before_data = []
     for i, pil_img in enumerate(all_before_frames):
-        cv_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        rgb_img = np.asarray(pil_img)
         before_data.append({
             "index": i,
             "pil": pil_img,
-            "cv": cv_img,
+            "rgb": rgb_img,
             "width": pil_img.width,
             "height": pil_img.height
         })
     
     after_data = []
     for i, pil_img in enumerate(all_after_frames):
-        cv_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        rgb_img = np.asarray(pil_img)
         after_data.append({
             "index": i,
             "pil": pil_img,
-            "cv": cv_img,
+            "rgb": rgb_img,
             "width": pil_img.width,
             "height": pil_img.height
         })
     
-    # STEP 2: Detect defects from ALL before images
+    # STEP 2+3: Detect defects from ALL before images and verify each one
+    # All Groq calls are submitted up front to a bounded thread pool; results are
+    # consumed in order, so Phase 2 for early defects overlaps later HTTP round-trips
+    loop = asyncio.get_running_loop()
+    
+    # Use first after image as reference for comparison (to identify what changed)
+    # This helps Groq understand what was the "defect" state
+    reference_pil = after_data[0]["pil"]
+    
+    def submit_detection(before: Dict) -> asyncio.Future:
+        return loop.run_in_executor(groq_executor, phase1_detect_defect, before["pil"], reference_pil)
+    
     detected_defects = []
-    for before in before_data:
+    defect_results = []
+    # Responses built on a failed Groq call are not cached, so a retry re-runs them
+    groq_failed = False
+    pending = [submit_detection(before) for before in before_data]
+    
+    for before, detection_future in zip(before_data, pending):
         print(f"[Analyze] Detecting defects in before image {before['index']}...")
+        detection = await detection_future
+        if "error" in detection:
+            groq_failed = True
         
-        # Use first after image as reference for comparison (to identify what changed)
-        # This helps Groq understand what was the "defect" state
-        detection = phase1_detect_defect(before["pil"], after_data[0]["pil"])
-        
-        if detection.get("has_defect"):
-            detected_defects.append({
-                "defect_id": f"defect_{len(detected_defects)}",
-                "before_image_idx": before["index"],
-                "description": detection["description"],
-                "bbox_percent": detection["bbox_percent"],
-                "before_data": before
-            })
-            print(f"  → Found defect: {detection['description']}")
-        else:
+        if not detection.get("has_defect"):
             print(f"  → No defect detected")
+            continue
+        
+        defect = {
+            "defect_id": f"defect_{len(detected_defects)}",
+            "before_image_idx": before["index"],
+            "description": detection["description"],
+            "bbox_percent": detection["bbox_percent"],
+            "before_data": before
+        }
+        detected_defects.append(defect)
+        print(f"  → Found defect: {detection['description']}")
+        
+        # Phase 2 (ResNet/CLIP) runs off the event loop, overlapping the pending Groq calls
+        defect_results.append(await asyncio.to_thread(verify_defect, defect, after_data, use_clip=after_had_video))
     
     # If no defects found in any before image
     if not detected_defects:
-        return {
+        result = {
             "verdict": "NO_DEFECT",
             "summary": "No defects detected in before images",
             "fixed_count": 0,
             "total_defects": 0,
             "defects": [],
-            "before_images": [image_to_base64(b["pil"]) for b in before_data],
-            "after_images": [image_to_base64(a["pil"]) for a in after_data]
+            "before_images": [frame_base64(b) for b in before_data],
+            "after_images": [frame_base64(a) for a in after_data]
         }
-    
-    # STEP 3: For each defect, find best matching after image and verify repair
-    defect_results = []
-    
-    for defect in detected_defects:
-        print(f"[Analyze] Processing {defect['defect_id']}: {defect['description']}")
-        
-        before = defect["before_data"]
-        bbox_percent = defect["bbox_percent"]
-        
-        # Try each after image and find the best match
-        best_result = None
-        best_confidence = -1
-        best_after_idx = None
-        
-        for after in after_data:
-            try:
-                # Resize after image to match before image dimensions for comparison
-                after_resized = after["pil"].resize((before["width"], before["height"]))
-                after_cv_resized = cv2.cvtColor(np.array(after_resized), cv2.COLOR_RGB2BGR)
-                
-                # Convert bbox to pixels
-                bbox_pixels = convert_bbox_percent_to_pixels(
-                    bbox_percent, before["width"], before["height"]
-                )
-                x1, y1, x2, y2 = bbox_pixels
-                
-                # Extract regions
-                before_region = before["cv"][y1:y2, x1:x2]
-                after_region = after_cv_resized[y1:y2, x1:x2]
-                
-                if before_region.size == 0 or after_region.size == 0:
-                    continue
-                
-                # Verify repair - use CLIP for video mode, ResNet for image mode
-                if after_had_video:
-                    result = phase2_verify_repair_video(before_region, after_region)
-                else:
-                    result = phase2_verify_repair(before_region, after_region)
-                
-                # Track best result (highest confidence for FIXED, or least bad for NOT_FIXED)
-                if result["is_fixed"]:
-                    # For fixed results, prefer higher confidence
-                    if result["confidence"] > best_confidence:
-                        best_confidence = result["confidence"]
-                        best_result = result
-                        best_after_idx = after["index"]
-                elif best_result is None or not best_result.get("is_fixed"):
-                    # For not-fixed, track the one with highest score (closest to maybe fixed)
-                    score = result.get("feature_distance", result.get("similarity", 0))
-                    if score > best_confidence:
-                        best_confidence = score
-                        best_result = result
-                        best_after_idx = after["index"]
-                        
-            except Exception as e:
-                print(f"  Error comparing with after image {after['index']}: {e}")
-                continue
-        
-        # Build result for this defect
-        if best_result:
-            defect_results.append({
-                "defect_id": defect["defect_id"],
-                "status": "success",
-                "description": defect["description"],
-                "before_image_idx": defect["before_image_idx"],
-                "best_after_image_idx": best_after_idx,
-                "bbox": {
-                    "x": bbox_percent[0],
-                    "y": bbox_percent[1],
-                    "width": bbox_percent[2],
-                    "height": bbox_percent[3]
-                },
-                "phase2_deep_learning": {
-                    "verdict": best_result["verdict"],
-                    "is_fixed": best_result["is_fixed"],
-                    "confidence": best_result["confidence"],
-                    "feature_distance": best_result.get("feature_distance", 0),
-                    "similarity": best_result.get("similarity", 0),
-                    "method": best_result.get("method", "unknown")
-                },
-                "before_image": image_to_base64(before["pil"]),
-                "after_image": image_to_base64(after_data[best_after_idx]["pil"]) if best_after_idx is not None else None
-            })
-            print(f"  → {best_result['verdict']} (confidence: {best_result['confidence']:.2f}, method: {best_result.get('method', 'unknown')})")
-        else:
-            defect_results.append({
-                "defect_id": defect["defect_id"],
-                "status": "error",
-                "description": defect["description"],
-                "before_image_idx": defect["before_image_idx"],
-                "message": "Could not verify repair for this defect"
-            })
+        if not groq_failed:
+            cache_result(cache_key, result)
+        return result
     
     # STEP 4: Calculate overall verdict
     fixed_count = sum(1 for d in defect_results if d.get("phase2_deep_learning", {}).get("is_fixed", False))
@@ -749,15 +1063,15 @@ async def analyze(
     
     print(f"[Analyze] Final verdict: {overall_verdict} ({fixed_count}/{total_defects} defects fixed)")
     
-    return {
+    result = {
         "verdict": overall_verdict,
         "summary": f"{fixed_count}/{total_defects} defects fixed",
         "fixed_count": fixed_count,
         "total_defects": total_defects,
         "defects": defect_results,
         # Include all raw images/frames for frontend display
-        "before_images": [image_to_base64(b["pil"]) for b in before_data],
-        "after_images": [image_to_base64(a["pil"]) for a in after_data],
+        "before_images": [frame_base64(b) for b in before_data],
+        "after_images": [frame_base64(a) for a in after_data],
         # Media info
         "media_info": {
             "before_frame_count": len(before_data),
@@ -766,6 +1080,9 @@ async def analyze(
             "after_had_video": "video" in after_media_types
         }
     }
+    if not groq_failed:
+        cache_result(cache_key, result)
+    return result
 
 
 if __name__ == "__main__":
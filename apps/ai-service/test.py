@@ -1,9 +1,14 @@
 """
 Test two-phase detection with multiple images
 """
+import contextlib
+import ijson
+import itertools
+import os
 import requests
-import traceback
-import base64
+import sys
+from requests_toolbelt import MultipartEncoder
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 url = "http://localhost:8003/analyze"
@@ -14,6 +19,41 @@ after_path1 = "/home/shashank/Desktop/side pros/gdg/images/wall_after.png"
 before_path2 = "/home/shashank/Desktop/side pros/gdg/images/wall_before1.png"
 after_path2 = "/home/shashank/Desktop/side pros/gdg/images/wall_after2.png"
 
+
+def save_data_url(data_url, output_file):
+    """Decode a base64 data URL and write it to disk"""
+    # Imported here so error responses never pay for the decoder import
+    try:
+        from pybase64 import b64decode  # SIMD decoder, much faster on multi-MB data URLs
+    except ImportError:
+        from base64 import b64decode
+    
+    # Slice past the data URL header instead of split() copying every part
+    b64_data = data_url[data_url.find(',') + 1:].encode('ascii')
+    with open(output_file, 'wb') as f:
+        f.write(b64decode(b64_data))
+        # Results are never read back; drop them from the page cache so the input images stay hot
+        if hasattr(os, 'posix_fadvise'):
+            f.flush()
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return output_file
+
+
+# Saves allowed in flight at once; each pending save holds a full data URL in memory
+MAX_PENDING_SAVES = 4
+
+
+def drain_saves(pending, limit=0):
+    """Report finished image saves, waiting until at most `limit` are still in flight"""
+    while True:
+        done, pending = wait(pending, timeout=None if len(pending) > limit else 0, return_when=FIRST_COMPLETED)
+        # result() re-raises any error from the save thread
+        sys.stdout.write("".join(f"✓ Saved: {save.result()}\n" for save in done))
+        if len(pending) <= limit:
+            return pending
+
+
 print("Testing Two-Phase AI Defect Detection (Batch Mode)")
 print("=" * 60)
 print("\nPhase 1: Groq Vision detects defect")
@@ -22,79 +62,112 @@ print("\nSending request with 2 pairs of images...")
 
 try:
     # Prepare multiple files
-    # We need to keep file handles open until request is sent
-    f1a = open(before_path1, 'rb')
-    f2a = open(after_path1, 'rb')
-    
-    f1b = open(before_path2, 'rb')
-    f2b = open(after_path2, 'rb')
+    # ExitStack keeps the files open until the request is sent and closes them on every exit path
+    with contextlib.ExitStack() as stack:
+        f1a = stack.enter_context(open(before_path1, 'rb'))
+        f2a = stack.enter_context(open(after_path1, 'rb'))
+        
+        f1b = stack.enter_context(open(before_path2, 'rb'))
+        f2b = stack.enter_context(open(after_path2, 'rb'))
 
-    # Note: 'before_images' and 'after_images' match the FastAPI endpoint parameters
-    files = [
-        ('before_images', ('before1.png', f1a, 'image/png')),
-        ('before_images', ('before2.png', f1b, 'image/png')),
-        ('after_images', ('after1.png', f2a, 'image/png')),
-        ('after_images', ('after2.png', f2b, 'image/png'))
-    ]
+        # Note: 'before_images' and 'after_images' match the FastAPI endpoint parameters
+        # MultipartEncoder streams the files from disk instead of building the whole body in memory
+        encoder = MultipartEncoder(fields=[
+            ('before_images', ('before1.png', f1a, 'image/png')),
+            ('before_images', ('before2.png', f1b, 'image/png')),
+            ('after_images', ('after1.png', f2a, 'image/png')),
+            ('after_images', ('after2.png', f2b, 'image/png'))
+        ])
 
-    response = requests.post(url, files=files, timeout=120) # Increased timeout for batch
-    
-    # Close files
-    f1a.close()
-    f1b.close()
-    f2a.close()
-    f2b.close()
+        response = requests.post(
+            url,
+            data=encoder,
+            headers={'Content-Type': encoder.content_type},
+            stream=True,
+            timeout=120  # Increased timeout for batch
+        )
     
     print(f"\nStatus: {response.status_code}")
     
     if response.status_code == 200:
-        results = response.json()
-        print(f"\n✓ SUCCESS! Received {len(results)} results.\n")
+        print("\n✓ SUCCESS! Streaming results...\n")
         
         results_dir = Path("/home/shashank/Desktop/side pros/gdg/images/results")
         results_dir.mkdir(exist_ok=True)
 
-        for i, result in enumerate(results):
-            print(f"--- Result {i+1} ---")
-            
-            if result.get('status') == 'success':
-                # Phase 1 results
-                print("PHASE 1 - Groq Vision:")
-                p1 = result.get('phase1_groq', {})
-                print(f"  Defect Found: {p1.get('defect_found')}")
-                print(f"  Description: {p1.get('description')}")
-                print(f"  Location: {p1.get('location_pixels')}")
+        # Parse defects one at a time off the socket instead of buffering the whole response
+        response.raw.decode_content = True
+        # use_float keeps bbox/confidence values as floats rather than Decimal
+        events = ijson.parse(response.raw, use_float=True)
+        
+        # The overall verdict fields come before the defects list in the response
+        overview = {}
+        for prefix, event, value in events:
+            if prefix == 'defects' and event == 'start_array':
+                events = itertools.chain([(prefix, event, value)], events)
+                break
+            if prefix in ('verdict', 'summary', 'fixed_count', 'total_defects'):
+                overview[prefix] = value
+        
+        sys.stdout.write(
+            f"Overall Verdict: {overview.get('verdict')}\n"
+            f"Summary: {overview.get('summary')}\n"
+            f"Fixed: {overview.get('fixed_count')}/{overview.get('total_defects')}\n\n"
+        )
+        
+        # Decode/write images in the background while the next result is parsed
+        with ThreadPoolExecutor(max_workers=MAX_PENDING_SAVES) as save_pool:
+            pending = set()
+            i = -1  # Stays -1 if the response has no defects
+            for i, result in enumerate(ijson.items(events, 'defects.item')):
+                # Build each result's report and emit it with a single write
+                out = [f"--- Result {i+1} ---"]
                 
-                # Phase 2 results
-                print("\nPHASE 2 - Deep Learning:")
-                p2 = result.get('phase2_deep_learning', {})
-                print(f"  Verdict: {p2.get('verdict')}")
-                print(f"  Is Fixed: {p2.get('is_fixed')}")
-                print(f"  Confidence: {p2.get('confidence')}")
+                if result.get('status') == 'success':
+                    p2 = result.get('phase2_deep_learning', {})
+                    out += [
+                        # Phase 1 results
+                        "PHASE 1 - Groq Vision:",
+                        f"  Description: {result.get('description')}",
+                        f"  Before Image: {result.get('before_image_idx')}",
+                        f"  Location (%): {result.get('bbox')}",
+                        # Phase 2 results
+                        "\nPHASE 2 - Deep Learning:",
+                        f"  Verdict: {p2.get('verdict')}",
+                        f"  Is Fixed: {p2.get('is_fixed')}",
+                        f"  Confidence: {p2.get('confidence')}",
+                        f"  Method: {p2.get('method')}",
+                        f"  Best After Image: {result.get('best_after_image_idx')}",
+                    ]
+                    
+                    # Save images
+                    for img_type in ['before', 'after']:
+                        key = f"{img_type}_image"
+                        if result.get(key):
+                            output_file = results_dir / f"batch_test_{i}_{img_type}.jpg"
+                            pending.add(save_pool.submit(save_data_url, result[key], output_file))
+                else:
+                    out += [
+                        f"Status: {result.get('status')}",
+                        f"Message: {result.get('message')}",
+                    ]
                 
-                print(f"\nSummary: {result.get('summary')}")
+                out.append("-" * 40 + "\n\n")
+                sys.stdout.write("\n".join(out))
+                sys.stdout.flush()
                 
-                # Save images
-                for img_type in ['before', 'after']:
-                    key = f"{img_type}_image_annotated"
-                    if key in result:
-                        b64_data = result[key].split(',')[1]
-                        img_data = base64.b64decode(b64_data)
-                        
-                        output_file = results_dir / f"batch_test_{i}_{img_type}.jpg"
-                        with open(output_file, 'wb') as f:
-                            f.write(img_data)
-                        print(f"✓ Saved: {output_file}")
-            else:
-                print(f"Status: {result.get('status')}")
-                print(f"Message: {result.get('message')}")
+                # Bound in-flight saves so parsed data URLs don't pile up behind slow writes
+                pending = drain_saves(pending, limit=MAX_PENDING_SAVES)
             
-            print("-" * 40 + "\n")
+            drain_saves(pending)
+        
+        print(f"✓ Received {i + 1} results.")
 
     else:
         print(f"\n✗ Error: {response.status_code}")
         print(f"Response: {response.text}")
         
 except Exception as e:
+    import traceback
     print(f"\n✗ Exception: {e}")
     traceback.print_exc()
\ No newline at end of file